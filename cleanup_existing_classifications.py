@@ -2,11 +2,14 @@
 # Purpose: Find SKUs missing from the latest expert classification run and create file for reprocessing
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import os
+from table_io import read_table
 
 # ====== CONFIG ======
 ORIGINAL_EXCEL = "dataset_product_type.xlsx"
-MASTER_FILE = "master_product_classifications_expert.xlsx"
+MASTER_FILE = "master_product_classifications_expert.parquet"
 MISSING_PRODUCTS_FILE = "remaining_missing_products_expert.xlsx"
 # ====================
 
@@ -27,20 +30,21 @@ def find_remaining_missing_products():
     
     # Load original dataset
     print("Loading original dataset...")
-    original_df = pd.read_excel(ORIGINAL_EXCEL)
-    original_skus = set(original_df['sku'].astype(str))
+    original_df = read_table(ORIGINAL_EXCEL)
+    original_sku_col = original_df['sku'].astype("string[pyarrow]")
+    original_skus = pd.Index(original_sku_col).unique()
     print(f"Original dataset: {len(original_df):,} products")
     print(f"Unique SKUs: {len(original_skus):,}")
     
     # Load master classified file
     print("\nLoading expert-classified master file...")
-    master_df = pd.read_excel(MASTER_FILE)
-    processed_skus = set(master_df['sku'].astype(str))
+    master_df = pd.read_parquet(MASTER_FILE, columns=['sku'])
+    processed_skus = pd.Index(master_df['sku'].astype("string[pyarrow]")).unique()
     print(f"Expert-classified products: {len(master_df):,}")
     print(f"Unique processed SKUs: {len(processed_skus):,}")
     
     # Find missing SKUs
-    missing_skus = original_skus - processed_skus
+    missing_skus = original_skus.difference(processed_skus)
     print(f"\nRemaining missing SKUs: {len(missing_skus):,}")
     
     if len(missing_skus) == 0:
@@ -53,7 +57,9 @@ def find_remaining_missing_products():
     print(f"\nCreating reprocessing dataset with {len(missing_skus):,} remaining products...")
     
     # Filter original dataset to only missing SKUs
-    missing_df = original_df[original_df['sku'].astype(str).isin(missing_skus)].copy()
+    # Membership test on Arrow's C hash table; Series.isin adds a costly round-trip through Python objects here
+    is_missing = pc.is_in(pa.array(original_sku_col), value_set=pa.array(missing_skus)).to_numpy(zero_copy_only=False)
+    missing_df = original_df[is_missing]
     
     # Save to new Excel file
     missing_df.to_excel(MISSING_PRODUCTS_FILE, index=False)
@@ -121,7 +127,7 @@ def analyze_what_was_missed():
         return
     
     try:
-        missing_df = pd.read_excel(MISSING_PRODUCTS_FILE)
+        missing_df = read_table(MISSING_PRODUCTS_FILE)
         
         # Find title column
         title_col = None
@@ -132,20 +138,16 @@ def analyze_what_was_missed():
                 break
         
         if title_col:
-            # Analyze patterns in missing product titles
-            titles = missing_df[title_col].astype(str)
+            # Analyze patterns in missing product titles (sample first 1000)
+            titles = missing_df[title_col].head(1000).astype(str).astype("string[pyarrow]")
             
             # Look for common words in missing products
-            all_words = []
-            for title in titles.head(1000):  # Sample first 1000
-                words = title.split()
-                all_words.extend([word for word in words if len(word) > 3])
-            
-            from collections import Counter
-            word_counts = Counter(all_words)
+            words = titles.str.split().explode()
+            words = words[words.str.len() > 3]
+            word_counts = words.value_counts()
             
             print("Most common words in missing products:")
-            for word, count in word_counts.most_common(15):
+            for word, count in word_counts.head(15).items():
                 print(f"  {word}: {count} occurrences")
             
             print(f"\nThis can help identify if certain product types were systematically missed.")
@@ -162,7 +164,7 @@ def check_for_duplicates_in_master():
         return
     
     try:
-        master_df = pd.read_excel(MASTER_FILE)
+        master_df = pd.read_parquet(MASTER_FILE, columns=['sku', 'product_type_de'])
         
         # Check for duplicates
         duplicate_skus = master_df['sku'].duplicated().sum()
@@ -2,12 +2,16 @@
 # Purpose: Combine the latest Excel files into one master file and remove ERROR rows
 
 import pandas as pd
+import polars as pl
 import os
+import re
+from table_io import scan_chunk_file, list_chunk_files
 from datetime import datetime
 
 # ====== CONFIG ======
 EXCEL_OUTPUT_DIR = "excel_outputs"
-MASTER_OUTPUT_FILE = "master_product_classifications_expert.xlsx"
+MASTER_OUTPUT_FILE = "master_product_classifications_expert.parquet"
+MASTER_XLSX_FILE = "master_product_classifications_expert.xlsx"  # Excel copy for handoff (None = skip)
 # ====================
 
 def find_latest_processing_files():
@@ -15,57 +19,23 @@ def find_latest_processing_files():
     print("🔍 FINDING LATEST PROCESSING FILES:")
     print("=" * 50)
     
-    # Get all Excel files
-    all_files = [f for f in os.listdir(EXCEL_OUTPUT_DIR) if f.startswith('product_mapping_chunk_') and f.endswith('.xlsx')]
+    # Chunk number, date and time parsed from every chunk file name
+    entries = list_chunk_files(EXCEL_OUTPUT_DIR)
     
-    if not all_files:
+    if not entries:
         print("❌ No chunk files found!")
         return []
     
-    # Group files by date only (ignore time differences)
-    file_groups = {}
-    for file in all_files:
-        try:
-            # Extract date from filename (format: product_mapping_chunk_X_YYYYMMDD_HHMMSS.xlsx)
-            parts = file.split('_')
-            if len(parts) >= 5:
-                date_part = parts[-2]  # Get YYYYMMDD part
-                if date_part not in file_groups:
-                    file_groups[date_part] = []
-                file_groups[date_part].append(file)
-        except:
-            continue
-    
-    if not file_groups:
-        print("❌ No valid chunk files found!")
-        return []
-    
-    # Find the most recent date
-    latest_date = max(file_groups.keys())
-    latest_files = file_groups[latest_date]
-    
-    # Sort files by chunk number for proper order
-    def extract_chunk_number(filename):
-        try:
-            parts = filename.split('_')
-            return int(parts[2])  # chunk number is at index 2
-        except:
-            return 0
-    
-    latest_files.sort(key=extract_chunk_number)
+    # Keep only the most recent date (ignore time differences), sorted by chunk number
+    latest_date = max(date for date, _, _, _ in entries)
+    latest_entries = [entry for entry in entries if entry[0] == latest_date]
+    latest_files = [name for _, _, _, name in latest_entries]
     
     print(f"Latest processing date: {latest_date}")
     print(f"Found {len(latest_files)} files from latest run:")
     
-    for file in latest_files:
-        # Extract file info for display
-        try:
-            parts = file.split('_')
-            chunk_num = parts[2]
-            time_part = parts[-1].replace('.xlsx', '')
-            print(f"  • Chunk {chunk_num}: {file} (time: {time_part})")
-        except:
-            print(f"  • {file}")
+    for _, chunk_num, time_part, file in latest_entries:
+        print(f"  • Chunk {chunk_num}: {file} (time: {time_part})")
     
     return latest_files
 
@@ -90,7 +60,7 @@ def combine_latest_files():
         return
     
     # Combine all files
-    all_data = []
+    clean_scans = []
     total_products = 0
     total_errors = 0
     chunk_summary = []
@@ -99,12 +69,11 @@ def combine_latest_files():
         file_path = os.path.join(EXCEL_OUTPUT_DIR, excel_file)
         
         try:
-            df = pd.read_excel(file_path)
+            lf = scan_chunk_file(file_path, ['sku', 'product_type_de'])
+            is_error = pl.col('sku').str.starts_with('ERROR').fill_null(False)
             
-            # Count products and errors in this chunk
-            chunk_products = len(df)
-            error_rows = df[df['sku'].str.startswith('ERROR', na=False)]
-            chunk_errors = len(error_rows)
+            # Count products and errors in this chunk (only the sku column is read)
+            chunk_products, chunk_errors = lf.select(pl.len(), is_error.sum()).collect().row(0)
             clean_rows = chunk_products - chunk_errors
             
             chunk_summary.append({
@@ -116,8 +85,7 @@ def combine_latest_files():
             })
             
             # Add clean rows only (remove ERROR entries)
-            clean_df = df[~df['sku'].str.startswith('ERROR', na=False)].copy()
-            all_data.append(clean_df)
+            clean_scans.append(lf.filter(~is_error))
             
             total_products += chunk_products
             total_errors += chunk_errors
@@ -131,12 +99,21 @@ def combine_latest_files():
     print(f"\n📊 COMBINATION SUMMARY:")
     print("=" * 40)
     
-    if all_data:
-        master_df = pd.concat(all_data, ignore_index=True)
+    if clean_scans:
+        # Stream the clean rows into the Parquet master file without building one big DataFrame
+        original_count = total_products - total_errors
+        combined = pl.concat(clean_scans)
+        
+        # Add metadata (categorical, so the master file stores each column's single value once, dictionary-encoded)
+        processed_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        metadata = [
+            pl.lit(processed_date, dtype=pl.Categorical).alias('processed_date'),
+            pl.lit("expert_prompt_v2", dtype=pl.Categorical).alias('processing_version'),
+        ]
         
         # Remove any potential duplicates
-        original_count = len(master_df)
-        master_df = master_df.drop_duplicates(subset=['sku'], keep='first')
+        combined.unique(subset=['sku'], keep='first', maintain_order=True).with_columns(metadata).sink_parquet(MASTER_OUTPUT_FILE)
+        master_df = pd.read_parquet(MASTER_OUTPUT_FILE)
         final_count = len(master_df)
         duplicates_removed = original_count - final_count
         
@@ -149,16 +126,14 @@ def combine_latest_files():
             
         print(f"Final master file products: {final_count:,}")
         
-        # Add metadata
-        master_df['processed_date'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        master_df['processing_version'] = "expert_prompt_v2"
-        
-        # Save master file
-        master_df[['sku', 'product_type_de']].to_excel(MASTER_OUTPUT_FILE, index=False, sheet_name="Expert Classifications")
-        
         print(f"\n✅ Master file created: {MASTER_OUTPUT_FILE}")
         print(f"   Contains: {final_count:,} expertly classified products")
         
+        # Save Excel copy of the master file
+        if MASTER_XLSX_FILE:
+            master_df[['sku', 'product_type_de']].to_excel(MASTER_XLSX_FILE, index=False, sheet_name="Expert Classifications")
+            print(f"   Excel copy: {MASTER_XLSX_FILE}")
+        
         # Analyze results with expert prompt
         analyze_expert_classifications(master_df)
         
@@ -190,16 +165,31 @@ def analyze_expert_classifications(df):
         '2K-', '3-Wege', '2-Wege', 'HACCP', 'FAZ', '6-kant'
     ]
     
+    # One regex pass over the column instead of one pass per pattern
+    product_types = df['product_type_de'].astype("string[pyarrow]")
+    combined_pattern = "|".join(re.escape(pattern) for pattern in technical_patterns)
+    mask_any = product_types.str.contains(combined_pattern, case=False, regex=True, na=False)
+    
     issues_found = False
-    for pattern in technical_patterns:
-        matching = df[df['product_type_de'].str.contains(pattern, case=False, na=False)]
-        if len(matching) > 0:
-            issues_found = True
-            print(f"  ⚠️  {pattern}: {len(matching):,} products still contain this term")
-            # Show a few examples
-            examples = matching['product_type_de'].value_counts().head(3)
-            for example, count in examples.items():
-                print(f"      Example: {example} ({count:,} products)")
+    if mask_any.any():
+        # Only the (usually few) products containing a term go through the extraction
+        matches = product_types[mask_any].str.extractall(f"({combined_pattern})", flags=re.IGNORECASE)[0].str.lower()
+        
+        # Count each product once per pattern, even if the term appears twice
+        hits = pd.DataFrame({
+            'row': matches.index.get_level_values(0),
+            'pattern': matches.to_numpy()
+        }).drop_duplicates()
+        
+        for pattern in technical_patterns:
+            matching_rows = hits.loc[hits['pattern'] == pattern.lower(), 'row']
+            if len(matching_rows) > 0:
+                issues_found = True
+                print(f"  ⚠️  {pattern}: {len(matching_rows):,} products still contain this term")
+                # Show a few examples
+                examples = df.loc[matching_rows, 'product_type_de'].value_counts().head(3)
+                for example, count in examples.items():
+                    print(f"      Example: {example} ({count:,} products)")
     
     if not issues_found:
         print("  ✅ Excellent! No technical specifications found in classifications!")
@@ -208,8 +198,8 @@ def analyze_expert_classifications(df):
     # Check for clean, simple classifications
     print(f"\n📋 SAMPLE OF EXPERT CLASSIFICATIONS:")
     sample_df = df.sample(n=min(15, len(df)))
-    for _, row in sample_df.iterrows():
-        print(f"  {row['sku']}: {row['product_type_de']}")
+    for sku, product_type in sample_df[['sku', 'product_type_de']].itertuples(index=False, name=None):
+        print(f"  {sku}: {product_type}")
     
     # Calculate success metrics
     total_original = 470837  # Your original dataset size
@@ -0,0 +1,65 @@
+# convert_to_parquet.py
+# Purpose: One-time conversion of the Excel datasets and chunk outputs to Parquet for much faster reads
+
+import pandas as pd
+import os
+from table_io import fresh_parquet_path, list_chunk_files
+
+# ====== CONFIG ======
+EXCEL_FILES = [
+    "dataset.xlsx",
+    "dataset_product_type.xlsx",
+    "missing_products_for_reprocessing.xlsx",
+    "remaining_missing_products_expert.xlsx",
+]
+EXCEL_OUTPUT_DIR = "excel_outputs"
+COMPRESSION = "zstd"
+# ====================
+
+def convert_file(excel_path):
+    """Convert one Excel file to a Parquet file next to it"""
+    # Skip files that were already converted and haven't changed since
+    if parquet_path := fresh_parquet_path(excel_path):
+        print(f"  • {excel_path}: up to date")
+        return parquet_path
+    
+    parquet_path = os.path.splitext(excel_path)[0] + ".parquet"
+    
+    df = pd.read_excel(excel_path, engine="calamine")
+    
+    # Mixed int/str object columns (e.g. numeric SKUs) can't be written by pyarrow
+    object_cols = [col for col in df.columns if df[col].dtype == object]
+    df[object_cols] = df[object_cols].astype("string")
+    
+    df.to_parquet(parquet_path, engine="pyarrow", compression=COMPRESSION, index=False)
+    
+    excel_mb = os.path.getsize(excel_path) / 1024 / 1024
+    parquet_mb = os.path.getsize(parquet_path) / 1024 / 1024
+    print(f"  ✅ {excel_path} → {parquet_path} ({len(df):,} rows, {excel_mb:.1f} MB → {parquet_mb:.1f} MB)")
+    return parquet_path
+
+def main():
+    """Main function"""
+    print("📦 CONVERTING EXCEL FILES TO PARQUET")
+    print("=" * 50)
+    
+    excel_files = [f for f in EXCEL_FILES if os.path.exists(f)]
+    
+    if os.path.exists(EXCEL_OUTPUT_DIR):
+        chunk_files = [name for _, _, _, name in list_chunk_files(EXCEL_OUTPUT_DIR) if name.endswith('.xlsx')]
+        excel_files.extend(os.path.join(EXCEL_OUTPUT_DIR, f) for f in chunk_files)
+    
+    if not excel_files:
+        print("❌ No Excel files found to convert")
+        return
+    
+    for excel_file in excel_files:
+        try:
+            convert_file(excel_file)
+        except Exception as e:
+            print(f"  ❌ Error converting {excel_file}: {e}")
+    
+    print(f"\n🎉 Converted {len(excel_files)} files. The other scripts now read the .parquet copies automatically.")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -2,7 +2,11 @@
 # Purpose: Find SKUs that weren't processed and create a new dataset for reprocessing
 
 import pandas as pd
+import polars as pl
+import pyarrow as pa
+import pyarrow.compute as pc
 import os
+from table_io import read_table, scan_chunk_file, list_chunk_files
 
 # ====== CONFIG ======
 ORIGINAL_EXCEL = "dataset.xlsx"
@@ -17,37 +21,41 @@ def find_missing_products():
     
     # Load original dataset
     print("Loading original dataset...")
-    original_df = pd.read_excel(ORIGINAL_EXCEL)
-    original_skus = set(original_df['sku'].astype(str))
+    original_df = read_table(ORIGINAL_EXCEL)
+    original_sku_col = original_df['sku'].astype("string[pyarrow]")
+    original_skus = pd.Index(original_sku_col).unique()
     print(f"Original dataset: {len(original_df):,} products")
     print(f"Unique SKUs: {len(original_skus):,}")
     
     # Collect all processed SKUs from Excel outputs
     print("\nCollecting processed SKUs from output files...")
-    processed_skus = set()
+    chunk_scans = []
     
-    excel_files = [f for f in os.listdir(EXCEL_OUTPUT_DIR) if f.startswith('product_mapping_chunk_') and f.endswith('.xlsx')]
-    excel_files.sort()
+    excel_files = [name for _, _, _, name in list_chunk_files(EXCEL_OUTPUT_DIR)]
     
     total_processed = 0
     for excel_file in excel_files:
         file_path = os.path.join(EXCEL_OUTPUT_DIR, excel_file)
-        df = pd.read_excel(file_path)
+        lf = scan_chunk_file(file_path, ['sku'])
+        chunk_scans.append(lf)
         
-        # Get SKUs from this chunk (convert to string for consistency)
-        chunk_skus = set(df['sku'].astype(str))
-        processed_skus.update(chunk_skus)
-        
-        chunk_count = len(df)
+        chunk_count = lf.select(pl.len()).collect().item()
         total_processed += chunk_count
         
         print(f"  {excel_file}: {chunk_count:,} products")
     
+    # Only the sku column is scanned; the Arrow-backed Index keeps SKUs out of Python string objects
+    if chunk_scans:
+        unique_skus = pl.concat(chunk_scans).unique(subset=['sku']).collect(engine="streaming")['sku']
+        processed_skus = pd.Index(unique_skus.to_pandas(), dtype="string[pyarrow]")
+    else:
+        processed_skus = pd.Index([], dtype="string[pyarrow]")
+    
     print(f"\nTotal processed: {total_processed:,} products")
     print(f"Unique processed SKUs: {len(processed_skus):,}")
     
     # Find missing SKUs
-    missing_skus = original_skus - processed_skus
+    missing_skus = original_skus.difference(processed_skus)
     print(f"\nMissing SKUs: {len(missing_skus):,}")
     
     if len(missing_skus) == 0:
@@ -58,7 +66,9 @@ def find_missing_products():
     print(f"\nCreating reprocessing dataset with {len(missing_skus):,} missing products...")
     
     # Filter original dataset to only missing SKUs
-    missing_df = original_df[original_df['sku'].astype(str).isin(missing_skus)].copy()
+    # Reuse the already cast SKU column; pyarrow's is_in skips Series.isin's object conversion
+    is_missing = pc.is_in(pa.array(original_sku_col), value_set=pa.array(missing_skus)).to_numpy(zero_copy_only=False)
+    missing_df = original_df[is_missing]
     
     # Save to new Excel file
     missing_df.to_excel(MISSING_PRODUCTS_FILE, index=False)
@@ -94,19 +104,14 @@ def check_for_duplicates_in_output():
     print("\n🔍 CHECKING FOR DUPLICATE PROCESSING:")
     print("=" * 50)
     
-    all_processed_skus = []
-    
-    excel_files = [f for f in os.listdir(EXCEL_OUTPUT_DIR) if f.startswith('product_mapping_chunk_') and f.endswith('.xlsx')]
-    
-    for excel_file in excel_files:
-        file_path = os.path.join(EXCEL_OUTPUT_DIR, excel_file)
-        df = pd.read_excel(file_path)
-        all_processed_skus.extend(df['sku'].astype(str).tolist())
+    excel_files = [name for _, _, _, name in list_chunk_files(EXCEL_OUTPUT_DIR)]
+    chunk_scans = [scan_chunk_file(os.path.join(EXCEL_OUTPUT_DIR, f), ['sku']) for f in excel_files]
     
     # Check for duplicates
-    from collections import Counter
-    sku_counts = Counter(all_processed_skus)
-    duplicates = {sku: count for sku, count in sku_counts.items() if count > 1}
+    duplicates = {}
+    if chunk_scans:
+        sku_counts = pl.concat(chunk_scans).group_by('sku', maintain_order=True).len().filter(pl.col('len') > 1).collect()
+        duplicates = dict(sku_counts.iter_rows())
     
     if duplicates:
         print(f"Found {len(duplicates)} SKUs processed multiple times:")
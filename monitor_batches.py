@@ -1,99 +1,158 @@
 # monitor_batches.py
 # Purpose: Monitor the status of running OpenAI batch jobs
 
+import os
+import sys
 import time
-from openai import OpenAI
+import shelve
+import httpx
+import asyncio
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 from datetime import datetime
+from functools import lru_cache
 
 load_dotenv()
 
-CLIENT = OpenAI()
+HTTP_CLIENT = httpx.AsyncClient(  # Keep-alive connection pool shared by all API calls
+    http2=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=120),
+    timeout=httpx.Timeout(60.0),
+)
+CLIENT = AsyncOpenAI(http_client=HTTP_CLIENT)
+BATCH_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "openai_batch_meta")  # Finished batches never change
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
 
-def monitor_all_batches():
+@lru_cache(maxsize=4096)
+def format_timestamp(timestamp):
+    """Format an epoch second for display (cached, since batches submitted together share timestamps)"""
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+def get_request_counts(batch):
+    """Return (completed, failed, total) request counts for a batch, or None when it has no progress info"""
+    counts = getattr(batch, 'request_counts', None)
+    if not counts:
+        return None
+    return counts.completed or 0, counts.failed or 0, counts.total or 0
+
+async def monitor_all_batches():
     """Monitor all batch jobs"""
-    print("Fetching all batch jobs...")
-    
-    # Get all batches
-    batches = CLIENT.batches.list(limit=100)
-    
-    if not batches.data:
-        print("No batch jobs found")
-        return
-    
-    print(f"Found {len(batches.data)} batch jobs:\n")
-    
-    # Group by status
-    status_groups = {}
-    for batch in batches.data:
-        status = batch.status
-        if status not in status_groups:
-            status_groups[status] = []
-        status_groups[status].append(batch)
-    
-    # Display by status
-    for status, batch_list in status_groups.items():
-        print(f"📊 {status.upper()}: {len(batch_list)} jobs")
+    try:
+        print("Fetching all batch jobs...")
+        
+        # Get all batches
+        batches = await CLIENT.batches.list(limit=100)
+        
+        if not batches.data:
+            print("No batch jobs found")
+            return
         
-        for batch in batch_list:
-            created = datetime.fromtimestamp(batch.created_at).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"Found {len(batches.data)} batch jobs:\n")
+        
+        # Group by status
+        status_groups = {}
+        for batch in batches.data:
+            status = batch.status
+            if status not in status_groups:
+                status_groups[status] = []
+            status_groups[status].append(batch)
+        
+        # Display by status (collected into one write instead of a print per line)
+        lines = []
+        for status, batch_list in status_groups.items():
+            lines.append(f"📊 {status.upper()}: {len(batch_list)} jobs\n")
             
-            if hasattr(batch, 'request_counts') and batch.request_counts:
-                completed = batch.request_counts.completed or 0
-                failed = batch.request_counts.failed or 0
-                total = batch.request_counts.total or 0
-                progress = f"({completed}/{total} completed, {failed} failed)"
-            else:
-                progress = "(progress unknown)"
+            for batch in batch_list:
+                created = format_timestamp(int(batch.created_at))
+                
+                if counts := get_request_counts(batch):
+                    completed, failed, total = counts
+                    progress = f"({completed}/{total} completed, {failed} failed)"
+                else:
+                    progress = "(progress unknown)"
+                
+                lines.append(f"  • {batch.id} - Created: {created} {progress}\n")
             
-            print(f"  • {batch.id} - Created: {created} {progress}")
+            lines.append("\n")
         
-        print()
+        sys.stdout.write("".join(lines))
+    finally:
+        await CLIENT.close()
 
-def monitor_specific_batches(batch_ids):
+def load_cached_batch(cache, batch_id):
+    """Return a cached batch, or None if it isn't cached or can't be read (e.g. after an SDK upgrade)"""
+    try:
+        return cache.get(batch_id)
+    except Exception:
+        return None
+
+async def monitor_specific_batches(batch_ids):
     """Monitor specific batch jobs"""
-    print(f"Monitoring {len(batch_ids)} specific batches:\n")
-    
-    for batch_id in batch_ids:
-        try:
-            batch = CLIENT.batches.retrieve(batch_id)
-            created = datetime.fromtimestamp(batch.created_at).strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        print(f"Monitoring {len(batch_ids)} specific batches:\n")
+        
+        os.makedirs(os.path.dirname(BATCH_CACHE_FILE), exist_ok=True)
+        with shelve.open(BATCH_CACHE_FILE) as cache:
+            # Batches that already finished are served from the cache
+            batches = {}
+            for batch_id in batch_ids:
+                if (batch := load_cached_batch(cache, batch_id)) is not None:
+                    batches[batch_id] = batch
+            to_fetch = [batch_id for batch_id in dict.fromkeys(batch_ids) if batch_id not in batches]
             
-            if hasattr(batch, 'request_counts') and batch.request_counts:
-                completed = batch.request_counts.completed or 0
-                failed = batch.request_counts.failed or 0
-                total = batch.request_counts.total or 0
-                progress_pct = (completed / total * 100) if total > 0 else 0
-                
-                print(f"📋 {batch_id}")
-                print(f"   Status: {batch.status}")
-                print(f"   Created: {created}")
-                print(f"   Progress: {completed}/{total} ({progress_pct:.1f}%)")
-                print(f"   Failed: {failed}")
-                
-                if batch.status == "completed" and batch.output_file_id:
-                    print(f"   Output file: {batch.output_file_id}")
-                elif batch.status == "failed" and hasattr(batch, 'errors'):
-                    print(f"   Errors: {batch.errors}")
+            # Retrieve the rest concurrently, then print them in the given order
+            results = await asyncio.gather(
+                *(CLIENT.batches.retrieve(batch_id) for batch_id in to_fetch),
+                return_exceptions=True
+            )
+            
+            for batch_id, batch in zip(to_fetch, results):
+                batches[batch_id] = batch
+                if not isinstance(batch, Exception) and batch.status in TERMINAL_STATUSES:
+                    cache[batch_id] = batch
+        
+        for batch_id in batch_ids:
+            batch = batches[batch_id]
+            if isinstance(batch, Exception):
+                print(f"❌ Error checking batch {batch_id}: {batch}\n")
+                continue
+            
+            try:
+                created = format_timestamp(int(batch.created_at))
                 
-            else:
-                print(f"📋 {batch_id}: {batch.status} (no progress info)")
+                if counts := get_request_counts(batch):
+                    completed, failed, total = counts
+                    progress_pct = (completed / total * 100) if total > 0 else 0
+                    
+                    print(f"📋 {batch_id}")
+                    print(f"   Status: {batch.status}")
+                    print(f"   Created: {created}")
+                    print(f"   Progress: {completed}/{total} ({progress_pct:.1f}%)")
+                    print(f"   Failed: {failed}")
+                    
+                    if batch.status == "completed" and batch.output_file_id:
+                        print(f"   Output file: {batch.output_file_id}")
+                    elif batch.status == "failed" and hasattr(batch, 'errors'):
+                        print(f"   Errors: {batch.errors}")
+                    
+                else:
+                    print(f"📋 {batch_id}: {batch.status} (no progress info)")
+                    
+                print()
                 
-            print()
-            
-        except Exception as e:
-            print(f"❌ Error checking batch {batch_id}: {e}\n")
+            except Exception as e:
+                print(f"❌ Error checking batch {batch_id}: {e}\n")
+    finally:
+        await CLIENT.close()
 
 def main():
-    import sys
-    
     if len(sys.argv) > 1:
         # Monitor specific batch IDs provided as arguments
         batch_ids = sys.argv[1:]
-        monitor_specific_batches(batch_ids)
+        asyncio.run(monitor_specific_batches(batch_ids))
     else:
         # Monitor all batches
-        monitor_all_batches()
+        asyncio.run(monitor_all_batches())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,11 +1,19 @@
 # run_batch_and_export.py
 # Purpose: Submit OpenAI Batch jobs for chunks, download results, and export to Excel
 
-import json
-import pandas as pd
+import orjson
+import re
+import xlsxwriter
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
+import sys
 import time
-from openai import OpenAI
+import httpx
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from openai import AsyncOpenAI, NotFoundError
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -14,60 +22,62 @@ load_dotenv()
 # ====== CONFIG ======
 BATCH_CHUNKS_DIR = "batch_chunks"
 RESULTS_DIR = "batch_results"
+STATE_FILE = os.path.join(RESULTS_DIR, "state.json")  # Batches whose results aren't on disk yet, so a restart resumes instead of re-submitting
 EXCEL_OUTPUT_DIR = "excel_outputs"
-CLIENT = OpenAI()
-POLL_INTERVAL = 300  # Check batch status every 5 minutes
+HTTP_CLIENT = httpx.AsyncClient(  # Keep-alive connection pool shared by all API calls
+    http2=True,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32, keepalive_expiry=120),
+    timeout=httpx.Timeout(60.0),
+)
+CLIENT = AsyncOpenAI(http_client=HTTP_CLIENT)
+MIN_POLL_INTERVAL = 15  # Poll quickly after any batch changes state...
+MAX_POLL_INTERVAL = 600  # ...and back off up to 10 minutes while nothing changes
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))  # Parallel chunk uploads
+RESULT_WORKERS = 4  # Parallel result downloads/exports while polling continues (also the export process count)
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "xlsx")  # "xlsx", or "parquet" for much faster writes
 # ====================
 
-def clean_response_content(content):
-    """Clean response content using the same method from our successful test"""
-    content = content.strip()
-    
-    # Remove markdown code blocks
-    if content.startswith('```json'):
-        content = content[7:]
-    elif content.startswith('```'):
-        content = content[3:]
-    
-    if content.endswith('```'):
-        content = content[:-3]
-    
-    # Remove any remaining ``` anywhere
-    content = content.replace('```', '')
-    content = content.strip()
-    
-    return content
+# Model responses: JSON optionally wrapped in a ```json fence, possibly with text around the array
+# (the fence body is matched as runs of non-backtick bytes, much faster than a lazy .*? scan)
+_FENCED_JSON_RE = re.compile(rb'```(?:json)?([^`]*(?:`(?!``)[^`]*)*)```')
+_JSON_ARRAY_RE = re.compile(rb'\[.*\]', re.S)
 
-def extract_json_array(content):
-    """Extract JSON array using simple string operations"""
-    # Find the first [ and last ]
-    start_pos = content.find('[')
-    end_pos = content.rfind(']')
-    
-    if start_pos != -1 and end_pos != -1 and start_pos < end_pos:
-        json_str = content[start_pos:end_pos + 1]
-        return json_str
-    return None
+# Chunk request files from build_requests_jsonl.py: requests_chunk_X.jsonl
+_CHUNK_RE = re.compile(r'requests_chunk_(.+)\.jsonl$')
+
+OUTPUT_COLUMNS = ["sku", "product_type_de"]
+TERMINAL_FAILURE_STATUSES = {"failed", "expired", "cancelled"}
+NO_OUTPUT_NOTE = " with no output file (every request failed)"
 
 def parse_response_content(content, custom_id):
     """Parse response content with robust error handling"""
     try:
-        # Clean the content first
-        cleaned_content = clean_response_content(content)
-        
-        if not cleaned_content:
-            return [{"sku": f"ERROR_EMPTY_{custom_id}", "product_type_de": "EmptyContent"}]
-        
-        # Try direct parsing first
+        # The prompt asks for a raw JSON array, so most responses parse as they are
         try:
-            data = json.loads(cleaned_content)
-        except json.JSONDecodeError:
-            # Try to extract JSON array using simple string operations
-            json_str = extract_json_array(cleaned_content)
-            if json_str:
-                data = json.loads(json_str)
-            else:
-                return [{"sku": f"ERROR_NO_JSON_{custom_id}", "product_type_de": "NoJSONFound"}]
+            data = orjson.loads(content)
+        except orjson.JSONDecodeError:
+            data = None
+        
+        if data is None:
+            content = content.encode("utf-8")
+            
+            # Take the payload out of a ```json fence in one regex pass, or use the whole response
+            match = _FENCED_JSON_RE.search(content)
+            payload = (match.group(1) if match else content).strip()
+            
+            if not payload:
+                return [{"sku": f"ERROR_EMPTY_{custom_id}", "product_type_de": "EmptyContent"}]
+            
+            try:
+                data = orjson.loads(payload)
+            except orjson.JSONDecodeError:
+                # Fall back to the outermost [...] in the whole response, since a ``` inside a value
+                # ends the fence match early
+                match = _JSON_ARRAY_RE.search(content)
+                if match:
+                    data = orjson.loads(match.group(0))
+                else:
+                    return [{"sku": f"ERROR_NO_JSON_{custom_id}", "product_type_de": "NoJSONFound"}]
         
         if isinstance(data, dict):
             data = [data]
@@ -86,17 +96,17 @@ def parse_response_content(content, custom_id):
         print(f"Error parsing response for {custom_id}: {e}")
         return [{"sku": f"ERROR_PARSE_{custom_id}", "product_type_de": "ParseError"}]
 
-def submit_batch_job(jsonl_file):
+async def submit_batch_job(jsonl_file):
     """Submit a single batch job"""
     print(f"Uploading {jsonl_file}...")
     
     with open(jsonl_file, "rb") as f:
-        uploaded = CLIENT.files.create(file=f, purpose="batch")
+        uploaded = await CLIENT.files.create(file=f, purpose="batch")
     
     print(f"📤 Uploaded file ID: {uploaded.id}")
     
     # Create batch job
-    batch = CLIENT.batches.create(
+    batch = await CLIENT.batches.create(
         input_file_id=uploaded.id,
         endpoint="/v1/chat/completions",
         completion_window="24h"
@@ -105,12 +115,127 @@ def submit_batch_job(jsonl_file):
     print(f"🚀 Batch job created: {batch.id}")
     return batch.id, uploaded.id
 
-def check_batch_status(batch_id):
-    """Check the status of a batch job"""
-    batch = CLIENT.batches.retrieve(batch_id)
+def natural_key(text):
+    """Sort key that orders embedded numbers numerically (chunk 2 before chunk 10)"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', text)]
+
+async def submit_chunk(chunk, upload_slots):
+    """Upload and submit one (chunk_id, file_path) chunk file, returning (chunk_id, batch_id, file_id)"""
+    chunk_id, file_path = chunk
+    
+    try:
+        async with upload_slots:
+            batch_id, file_id = await submit_batch_job(file_path)
+        return chunk_id, batch_id, file_id
+    except Exception as e:
+        print(f"Error submitting {file_path}: {e}")
+        return chunk_id, None, None
+
+async def list_recent_batches():
+    """Fetch the most recent batch jobs in a single request, keyed by batch ID"""
+    try:
+        return {batch.id: batch for batch in (await CLIENT.batches.list(limit=100)).data}
+    except Exception as e:
+        print(f"Error listing batches: {e}")
+        return {}
+
+async def check_batch_status(batch_id, listed_batches):
+    """Check the status of a batch job, only retrieving it when it isn't in the batch listing"""
+    batch = listed_batches.get(batch_id) or await CLIENT.batches.retrieve(batch_id)
     return batch.status, batch
 
-def download_batch_results(batch):
+def batch_failed(status, batch):
+    """Whether a batch ended without results (when every request fails, a completed batch has no output file)"""
+    return status in TERMINAL_FAILURE_STATUSES or (status == "completed" and not batch.output_file_id)
+
+def chunk_stamp(file_path):
+    """Size and modification time of a chunk file, so saved batches are only resumed for the same file"""
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def estimate_next_check(batch, last_progress):
+    """Return the earliest time an in-progress batch is worth checking again, based on its completion rate"""
+    now = time.time()
+    counts = getattr(batch, 'request_counts', None)
+    if not counts or not counts.total:
+        return now
+    
+    completed = counts.completed or 0
+    previous = last_progress.get(batch.id)
+    last_progress[batch.id] = (now, completed)
+    if previous is None or completed <= previous[1]:
+        return now
+    
+    rate = (completed - previous[1]) / max(now - previous[0], 1e-6)
+    eta = (counts.total - completed) / rate
+    
+    # Never skip a batch for longer than the maximum poll interval
+    return now + min(eta, MAX_POLL_INTERVAL)
+
+def load_state():
+    """Load the unfinished batches saved by a previous run ({batch_id: [chunk_id, file_id, submitted_at, chunk_stamp]})"""
+    try:
+        with open(STATE_FILE, "rb") as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
+        return {}
+
+def save_state(saved_batches):
+    """Atomically save the unfinished batches, so a crash never leaves a half-written state file"""
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(saved_batches))
+    os.replace(tmp_path, STATE_FILE)
+
+async def resume_saved_batches(chunk_stamps):
+    """Reconcile the saved state with the chunk files and the API, returning (batches to keep, {batch_id: batch} ready to download)"""
+    saved = {}
+    for batch_id, entry in load_state().items():
+        # Chunk files rebuilt since the batch was submitted (or removed) get a fresh batch instead
+        if len(entry) == 4 and chunk_stamps.get(entry[0]) == entry[3]:
+            saved[batch_id] = tuple(entry)
+        else:
+            print(f"Ignoring saved batch {batch_id} (chunk {entry[0]}): its chunk file is missing or changed since it was submitted")
+    if not saved:
+        return {}, {}
+    
+    print(f"Found {len(saved)} batches from a previous run, checking their status...")
+    listed_batches = await list_recent_batches()
+    checks = await asyncio.gather(
+        *(check_batch_status(batch_id, listed_batches) for batch_id in saved),
+        return_exceptions=True
+    )
+    resumed = {}
+    completed = {}
+    
+    for (batch_id, entry), check in zip(saved.items(), checks):
+        chunk_id = entry[0]
+        if isinstance(check, NotFoundError):
+            # Deleted, or created under another API key or project
+            print(f"❌ Batch {batch_id} (chunk {chunk_id}) not found, chunk will be resubmitted")
+            continue
+        elif isinstance(check, Exception):
+            # Keep it; the poll loop retries the status check
+            print(f"Error checking batch {batch_id}: {check}")
+            status, batch = None, None
+        else:
+            status, batch = check
+        
+        if status is not None and batch_failed(status, batch):
+            print(f"❌ Batch {batch_id} (chunk {chunk_id}) {status}{NO_OUTPUT_NOTE if status == 'completed' else ''}, chunk will be resubmitted")
+            continue
+        
+        resumed[batch_id] = entry
+        if status == "completed":
+            # Finished (or its download failed) last time; download it without polling again
+            completed[batch_id] = batch
+            print(f"♻️  Resuming batch {batch_id} (chunk {chunk_id}): completed, downloading results")
+        else:
+            print(f"♻️  Resuming batch {batch_id} (chunk {chunk_id}): {status}")
+    
+    return resumed, completed
+
+async def download_batch_results(batch):
     """Download and parse batch results"""
     if not batch.output_file_id:
         raise Exception("No output file available")
@@ -121,139 +246,281 @@ def download_batch_results(batch):
     result_file_name = f"results_{batch.id}.jsonl"
     result_file_path = os.path.join(RESULTS_DIR, result_file_name)
     
-    content = CLIENT.files.content(batch.output_file_id)
-    
-    with open(result_file_path, "wb") as f:
-        f.write(content.content)
+    # Stream straight to disk instead of holding the whole results file in memory
+    async with CLIENT.files.with_streaming_response.content(batch.output_file_id) as response:
+        await response.stream_to_file(result_file_path, chunk_size=1 << 20)
     
     print(f"✅ Downloaded results to {result_file_path}")
     return result_file_path
 
-def process_results_to_excel(results_file, chunk_id):
-    """Process results JSONL file and create Excel output"""
-    print(f"Processing results file: {results_file}")
-    
-    rows = []
-    with open(results_file, "r", encoding="utf-8") as f:
+def iter_result_batches(results_file):
+    """Yield the parsed product rows of each response in a results JSONL file"""
+    with open(results_file, "rb", buffering=1 << 20) as f:
         for line_num, line in enumerate(f, 1):
             try:
-                obj = json.loads(line)
+                obj = orjson.loads(line)
                 custom_id = obj.get("custom_id", f"unknown_{line_num}")
                 
                 if "response" in obj and "body" in obj["response"]:
                     response_content = obj["response"]["body"]["choices"][0]["message"]["content"]
-                    parsed_data = parse_response_content(response_content, custom_id)
-                    rows.extend(parsed_data)
+                    yield parse_response_content(response_content, custom_id)
                 else:
                     # Handle error responses
                     error_info = obj.get("error", {})
-                    rows.append({
+                    yield [{
                         "sku": f"ERROR_{custom_id}",
                         "product_type_de": f"APIError: {error_info.get('message', 'Unknown error')}"
-                    })
+                    }]
                     
             except Exception as e:
                 print(f"Error processing line {line_num}: {e}")
-                rows.append({
+                yield [{
                     "sku": f"ERROR_LINE_{line_num}",
                     "product_type_de": f"LineProcessError: {str(e)}"
-                })
-    
-    # Create DataFrame and save to Excel
-    df_out = pd.DataFrame(rows)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_file = os.path.join(EXCEL_OUTPUT_DIR, f"product_mapping_chunk_{chunk_id}_{timestamp}.xlsx")
+                }]
+
+def output_values(row):
+    """Return a parsed row's output column values as text, so Excel and Parquet outputs hold the same data"""
+    return [None if (value := row.get(name)) is None else str(value) for name in OUTPUT_COLUMNS]
+
+def write_xlsx(output_file, batches):
+    """Write batches of rows to an Excel file, returning the row count"""
+    # Constant memory mode flushes each row to disk as it is written, so memory stays flat;
+    # cells are written as plain text (no formula or hyperlink conversion)
+    workbook = xlsxwriter.Workbook(output_file, {
+        'constant_memory': True,
+        'strings_to_formulas': False,
+        'strings_to_urls': False,
+    })
+    worksheet = workbook.add_worksheet("Product Mapping")
+    worksheet.write_row(0, 0, OUTPUT_COLUMNS)
     
-    df_out.to_excel(output_file, index=False, sheet_name="Product Mapping")
-    print(f"✅ Saved {len(df_out):,} rows to {output_file}")
-    print(f"   Source: {results_file} → {output_file}")  # Added traceability line
+    row_count = 0
+    for rows in batches:
+        for row in rows:
+            row_count += 1
+            worksheet.write_row(row_count, 0, output_values(row))
     
-    return output_file, len(df_out)
+    workbook.close()
+    return row_count
 
-def main():
-    # Create output directories
-    os.makedirs(RESULTS_DIR, exist_ok=True)
-    os.makedirs(EXCEL_OUTPUT_DIR, exist_ok=True)
+def write_parquet(output_file, batches):
+    """Write batches of rows to a Parquet file, returning the row count"""
+    rows = [output_values(row) for rows in batches for row in rows]
     
-    # Find all chunk files
-    chunk_files = [f for f in os.listdir(BATCH_CHUNKS_DIR) if f.endswith('.jsonl')]
-    chunk_files.sort()  # Process in order
+    # Transpose the rows into one text column per output column
+    columns = zip(*rows) if rows else [[] for _ in OUTPUT_COLUMNS]
+    table = pa.table({name: pa.array(column, pa.string()) for name, column in zip(OUTPUT_COLUMNS, columns)})
+    pq.write_table(table, output_file, compression="zstd")
+    return len(rows)
+
+def process_results_to_excel(results_file, chunk_id):
+    """Process results JSONL file and create the chunk output file (Excel or Parquet, see OUTPUT_FORMAT)"""
+    print(f"Processing results file: {results_file}")
     
-    if not chunk_files:
-        print(f"No .jsonl files found in {BATCH_CHUNKS_DIR}")
-        return
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_file = os.path.join(EXCEL_OUTPUT_DIR, f"product_mapping_chunk_{chunk_id}_{timestamp}.{OUTPUT_FORMAT}")
     
-    print(f"Found {len(chunk_files)} chunk files to process")
+    if OUTPUT_FORMAT == "parquet":
+        row_count = write_parquet(output_file, iter_result_batches(results_file))
+    else:
+        row_count = write_xlsx(output_file, iter_result_batches(results_file))
     
-    # Track all batch jobs
-    active_batches = {}  # batch_id: (chunk_id, file_id)
-    completed_chunks = []
+    print(f"✅ Saved {row_count:,} rows to {output_file}")
+    print(f"   Source: {results_file} → {output_file}")  # Added traceability line
     
-    # Submit all batch jobs
-    for chunk_file in chunk_files:
-        chunk_id = chunk_file.replace('requests_chunk_', '').replace('.jsonl', '')
-        file_path = os.path.join(BATCH_CHUNKS_DIR, chunk_file)
-        
-        try:
-            batch_id, file_id = submit_batch_job(file_path)
-            active_batches[batch_id] = (chunk_id, file_id)
-            print(f"Submitted chunk {chunk_id} as batch {batch_id}")
-            time.sleep(2)  # Brief pause between submissions
+    return output_file, row_count
+
+async def download_and_process(batch, chunk_id, result_slots, export_pool, saved_batches):
+    """Download a completed batch and write its chunk output, returning (chunk_id, output_file, row_count)"""
+    try:
+        async with result_slots:
+            results_file = await download_batch_results(batch)
             
-        except Exception as e:
-            print(f"Error submitting {chunk_file}: {e}")
-    
-    print(f"\n🚀 Submitted {len(active_batches)} batch jobs")
-    print("Now monitoring for completion...")
-    
-    # Monitor batch completion
-    while active_batches:
-        print(f"\n⏳ Checking status of {len(active_batches)} active batches...")
+            # Parsing and writing are CPU-bound, so run them in a worker process (off the event loop and the GIL)
+            loop = asyncio.get_running_loop()
+            excel_file, row_count = await loop.run_in_executor(export_pool, process_results_to_excel, results_file, chunk_id)
+        print(f"✅ Completed chunk {chunk_id}: {row_count:,} rows -> {excel_file}")
         
-        completed_batches = []
+        # Only forget the batch once its output is written; on failure the next run retries the download
+        saved_batches.pop(batch.id, None)
+        save_state(saved_batches)
+        return chunk_id, excel_file, row_count
         
-        for batch_id, (chunk_id, file_id) in active_batches.items():
-            try:
-                status, batch = check_batch_status(batch_id)
-                print(f"Batch {batch_id} (chunk {chunk_id}): {status}")
+    except Exception as e:
+        print(f"❌ Error processing results for chunk {chunk_id}: {e}")
+        return None
+
+async def amain():
+    # Create output directories
+    try:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        os.makedirs(EXCEL_OUTPUT_DIR, exist_ok=True)
+        
+        # Find all chunk files
+        chunk_files = [
+            (m.group(1), entry.path)
+            for entry in os.scandir(BATCH_CHUNKS_DIR)
+            if (m := _CHUNK_RE.match(entry.name))
+        ]
+        chunk_files.sort(key=lambda chunk: natural_key(chunk[0]))  # Process in chunk order
+        
+        if OUTPUT_FORMAT not in ("xlsx", "parquet"):
+            print(f"❌ Unknown OUTPUT_FORMAT: {OUTPUT_FORMAT} (use xlsx or parquet)")
+            return
+        
+        if not chunk_files:
+            print(f"No requests_chunk_*.jsonl files found in {BATCH_CHUNKS_DIR}")
+            return
+        
+        print(f"Found {len(chunk_files)} chunk files to process")
+        
+        # Completed batches are downloaded and written in the background so polling never waits on them
+        result_slots = asyncio.Semaphore(RESULT_WORKERS)
+        # Exports run inside result_slots, so more processes would sit idle; spawn keeps the children from
+        # forking the running event loop and its open connections
+        export_pool = ProcessPoolExecutor(max_workers=RESULT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        pending = []
+        
+        # Track all batch jobs, starting with any left unfinished by a previous run
+        chunk_stamps = {chunk_id: chunk_stamp(file_path) for chunk_id, file_path in chunk_files}
+        saved_batches, resumed_completed = await resume_saved_batches(chunk_stamps)  # batch_id: (chunk_id, file_id, submitted_at, chunk_stamp)
+        save_state(saved_batches)
+        active_batches = {batch_id: entry for batch_id, entry in saved_batches.items() if batch_id not in resumed_completed}
+        completed_chunks = []
+        
+        for batch_id, batch in resumed_completed.items():
+            chunk_id = saved_batches[batch_id][0]
+            pending.append(asyncio.create_task(download_and_process(batch, chunk_id, result_slots, export_pool, saved_batches)))
+        
+        # Only submit chunks that don't already have a batch
+        resumed_chunks = {entry[0] for entry in saved_batches.values()}
+        chunk_files = [chunk for chunk in chunk_files if chunk[0] not in resumed_chunks]
+        submitted = 0
+        
+        # Submit all batch jobs (uploads are network-bound, so run them concurrently)
+        upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        for next_submission in asyncio.as_completed([submit_chunk(chunk, upload_slots) for chunk in chunk_files]):
+            chunk_id, batch_id, file_id = await next_submission
+            if batch_id:
+                active_batches[batch_id] = saved_batches[batch_id] = (chunk_id, file_id, time.time(), chunk_stamps[chunk_id])
+                save_state(saved_batches)
+                submitted += 1
+                print(f"Submitted chunk {chunk_id} as batch {batch_id}")
+        
+        print(f"\n🚀 Submitted {submitted} batch jobs")
+        if resumed_chunks:
+            print(f"♻️  Resumed {len(resumed_chunks)} batch jobs from the previous run")
+        print("Now monitoring for completion...")
+        
+        # Monitor batch completion with adaptive polling
+        poll_interval = MIN_POLL_INTERVAL
+        last_status = {}  # batch_id: status from the previous check
+        last_progress = {}  # batch_id: (check time, completed requests)
+        next_check = {}  # batch_id: earliest time worth checking again
+        
+        while active_batches:
+            print(f"\n⏳ Checking status of {len(active_batches)} active batches...")
+            
+            # Skip batches that can't be done yet at their current completion rate
+            now = time.time()
+            due_batches = [batch_id for batch_id in active_batches if now >= next_check.get(batch_id, 0)]
+            status_changed = False
+            
+            if due_batches:
+                # One batches.list call per cycle; batches missing from it are retrieved concurrently
+                listed_batches = await list_recent_batches()
+                checks = await asyncio.gather(
+                    *(check_batch_status(batch_id, listed_batches) for batch_id in due_batches),
+                    return_exceptions=True
+                )
+            else:
+                checks = []
+            
+            # Status lines are collected and written once per cycle
+            lines = []
+            for batch_id, check in zip(due_batches, checks):
+                chunk_id = active_batches[batch_id][0]
+                
+                if isinstance(check, NotFoundError):
+                    # Deleted, or created under another API key or project, so it will never finish
+                    active_batches.pop(batch_id, None)
+                    saved_batches.pop(batch_id, None)
+                    save_state(saved_batches)
+                    lines.append(f"❌ Batch {batch_id} (chunk {chunk_id}) not found\n")
+                    continue
+                elif isinstance(check, Exception):
+                    lines.append(f"Error checking batch {batch_id}: {check}\n")
+                    continue
+                
+                status, batch = check
+                lines.append(f"Batch {batch_id} (chunk {chunk_id}): {status}\n")
+                
+                if status != last_status.get(batch_id):
+                    status_changed = True
+                    last_status[batch_id] = status
+                
+                if status == "in_progress":
+                    next_check[batch_id] = estimate_next_check(batch, last_progress)
                 
-                if status == "completed":
-                    completed_batches.append(batch_id)
+                elif batch_failed(status, batch):
+                    active_batches.pop(batch_id, None)
+                    saved_batches.pop(batch_id, None)
+                    save_state(saved_batches)
+                    lines.append(f"❌ Batch {batch_id} (chunk {chunk_id}) {status}{NO_OUTPUT_NOTE if status == 'completed' else ''}\n")
+                
+                elif status == "completed":
+                    # Stop polling, but keep it in the saved state until its results are written
+                    active_batches.pop(batch_id, None)
                     
                     # Download and process results
-                    try:
-                        results_file = download_batch_results(batch)
-                        excel_file, row_count = process_results_to_excel(results_file, chunk_id)
-                        completed_chunks.append((chunk_id, excel_file, row_count))
-                        print(f"✅ Completed chunk {chunk_id}: {row_count:,} rows -> {excel_file}")
-                        
-                    except Exception as e:
-                        print(f"❌ Error processing results for chunk {chunk_id}: {e}")
+                    pending.append(asyncio.create_task(download_and_process(batch, chunk_id, result_slots, export_pool, saved_batches)))
+            
+            sys.stdout.write("".join(lines))
+            
+            if active_batches:
+                # Check again soon after a state change, otherwise back off exponentially
+                # (cycles that checked nothing leave the interval alone)
+                if status_changed:
+                    poll_interval = MIN_POLL_INTERVAL
+                elif due_batches:
+                    poll_interval = min(poll_interval * 2, MAX_POLL_INTERVAL)
                 
-                elif status == "failed":
-                    completed_batches.append(batch_id)
-                    print(f"❌ Batch {batch_id} (chunk {chunk_id}) failed")
-                    
-            except Exception as e:
-                print(f"Error checking batch {batch_id}: {e}")
+                # Never sleep past the time a skipped batch is expected to finish; when every batch
+                # is waiting for its estimate, sleep straight to the first one
+                now = time.time()
+                due_times = [next_check.get(batch_id, 0) for batch_id in active_batches]
+                upcoming = [due_time for due_time in due_times if due_time > now]
+                if len(upcoming) == len(due_times):
+                    wait = min(upcoming) - now
+                elif upcoming:
+                    wait = min(poll_interval, min(upcoming) - now)
+                else:
+                    wait = poll_interval
+                
+                print(f"Waiting {wait:.0f} seconds before next check...")
+                await asyncio.sleep(wait)
         
-        # Remove completed batches from active list
-        for batch_id in completed_batches:
-            del active_batches[batch_id]
+        # Wait for the remaining downloads
+        for next_result in asyncio.as_completed(pending):
+            if result := await next_result:
+                completed_chunks.append(result)
+        export_pool.shutdown()
         
-        if active_batches:
-            print(f"Waiting {POLL_INTERVAL} seconds before next check...")
-            time.sleep(POLL_INTERVAL)
-    
-    # Summary
-    print(f"\n🎉 Processing complete!")
-    print(f"Completed chunks: {len(completed_chunks)}")
-    total_rows = sum(count for _, _, count in completed_chunks)
-    print(f"Total rows processed: {total_rows:,}")
-    
-    print("\nGenerated Excel files:")
-    for chunk_id, excel_file, row_count in completed_chunks:
-        print(f"  Chunk {chunk_id}: {excel_file} ({row_count:,} rows)")
+        # Summary
+        print(f"\n🎉 Processing complete!")
+        print(f"Completed chunks: {len(completed_chunks)}")
+        total_rows = sum(count for _, _, count in completed_chunks)
+        print(f"Total rows processed: {total_rows:,}")
+        
+        print(f"\nGenerated {OUTPUT_FORMAT} files:")
+        for chunk_id, excel_file, row_count in completed_chunks:
+            print(f"  Chunk {chunk_id}: {excel_file} ({row_count:,} rows)")
+    finally:
+        await CLIENT.close()
+
+def main():
+    asyncio.run(amain())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,42 @@
+# table_io.py
+# Purpose: Shared file helpers - read Excel files through their Parquet copies and list chunk output files
+
+import pandas as pd
+import polars as pl
+import os
+import re
+
+# Chunk output names: product_mapping_chunk_X_YYYYMMDD_HHMMSS.xlsx (or .parquet, see OUTPUT_FORMAT in run_batch_and_export.py)
+CHUNK_FILE_PATTERN = re.compile(r"product_mapping_chunk_(\d+)_(\d{8})_(\d{6})\.(xlsx|parquet)$")
+
+def fresh_parquet_path(path):
+    """Return the Parquet copy of a file (see convert_to_parquet.py) if it is up to date, otherwise None"""
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    if os.path.exists(parquet_path) and (not os.path.exists(path) or os.path.getmtime(parquet_path) >= os.path.getmtime(path)):
+        return parquet_path
+    return None
+
+def read_table(path, columns=None):
+    """Read an Excel file, using its Parquet copy when it is up to date"""
+    if parquet_path := fresh_parquet_path(path):
+        return pd.read_parquet(parquet_path, columns=columns)
+    return pd.read_excel(path, usecols=columns, engine="calamine")
+
+def scan_chunk_file(path, columns):
+    """Lazily scan a chunk output file, using its Parquet copy when it is up to date"""
+    if parquet_path := fresh_parquet_path(path):
+        lf = pl.scan_parquet(parquet_path).select(columns)
+    else:
+        lf = pl.from_pandas(pd.read_excel(path, usecols=columns, dtype=str, engine="calamine")).lazy()
+    return lf.with_columns(pl.col(columns).cast(pl.Utf8))
+
+def list_chunk_files(directory):
+    """List chunk output files as sorted (date, chunk_num, time, file_name) tuples"""
+    # An .xlsx and its Parquet copy count once (scan_chunk_file reads whichever is up to date)
+    names = {}
+    for entry in os.scandir(directory):
+        if m := CHUNK_FILE_PATTERN.match(entry.name):
+            key = (m.group(2), int(m.group(1)), m.group(3))
+            if key not in names or m.group(4) == "xlsx":
+                names[key] = entry.name
+    return sorted(key + (name,) for key, name in names.items())
\ No newline at end of file